@@ -2,8 +2,9 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 from pathlib import Path
 
-from .indexing import list_pdf_titles
-from .exporters import export_docx, export_pdf
+from .indexing import list_pdf_titles, build_consolidated_index, section_folders
+from .sorting import SORT_MODES, DEFAULT_SORT_MODE
+from .exporters import prepare_index, export_all
 from . import __app_name__, __version__
 
 # TODO: añadir selección de fuente con las fuentes del sistema.
@@ -42,6 +43,9 @@ class App:
         self.directory = tk.StringVar()
         self.export_docx_var = tk.BooleanVar(value=True)
         self.export_pdf_var = tk.BooleanVar(value=True)
+        self.export_csv_var = tk.BooleanVar(value=False)
+        self.export_html_var = tk.BooleanVar(value=False)
+        self.export_json_var = tk.BooleanVar(value=False)
         self.output_basename = tk.StringVar(value="00Índice_Documentos")  # sin tilde por si acaso
         self.doc_title_var = tk.StringVar(value="Índice de Documentos")
         self.show_title_var = tk.BooleanVar(value=True)
@@ -51,6 +55,9 @@ class App:
         self.font_family_var = tk.StringVar(value="Calibri")
         self.title_size_var = tk.IntVar(value=18)
         self.body_size_var = tk.IntVar(value=11)
+        self.sort_mode_var = tk.StringVar(value=DEFAULT_SORT_MODE)
+        self.sort_reverse_var = tk.BooleanVar(value=False)
+        self.sections_var = tk.BooleanVar(value=False)
 
         self.build_ui()
 
@@ -81,6 +88,26 @@ class App:
                   bootstyle=INFO if USING_TTKB else None).pack(side="left", padx=(8, 0))
         tb.Button(outrow, text="Restablecer", command=self.clear_output_dir).pack(side="left", padx=(8, 0))
 
+        # Sorting
+        sortrow = tb.Frame(frm); sortrow.pack(fill="x", pady=(0, 8))
+        tb.Label(sortrow, text="Ordenar por:").pack(side="left", padx=(0, 8))
+        sort_cb = tb.Combobox(
+            sortrow, state="readonly", values=list(SORT_MODES),
+            textvariable=self.sort_mode_var, width=10
+        )
+        sort_cb.pack(side="left")
+        sort_cb.bind("<<ComboboxSelected>>", lambda _e: self._rescan_if_ready())
+        tb.Checkbutton(
+            sortrow, text="Descendente", variable=self.sort_reverse_var,
+            command=self._rescan_if_ready,
+            bootstyle=SUCCESS if USING_TTKB else None
+        ).pack(side="left", padx=(12, 0))
+        tb.Checkbutton(
+            sortrow, text="Índice por secciones (subcarpetas)", variable=self.sections_var,
+            command=self._rescan_if_ready,
+            bootstyle=SUCCESS if USING_TTKB else None
+        ).pack(side="left", padx=(12, 0))
+
         # Detected list
         list_frame = tb.Labelframe(frm, text="Documentos PDF detectados")
         list_frame.pack(fill="both", expand=True, pady=(8, 8))
@@ -142,7 +169,12 @@ class App:
         tb.Checkbutton(
             cbx, text="Exportar a PDF (.pdf)", variable=self.export_pdf_var,
             bootstyle=SUCCESS if USING_TTKB else None
-        ).pack(side="left")
+        ).pack(side="left", padx=(0, 16))
+        for text, var in (("CSV", self.export_csv_var), ("HTML", self.export_html_var), ("JSON", self.export_json_var)):
+            tb.Checkbutton(
+                cbx, text=text, variable=var,
+                bootstyle=SUCCESS if USING_TTKB else None
+            ).pack(side="left", padx=(0, 12))
 
         # Actions
         actions = tb.Frame(frm); actions.pack(fill="x", pady=(12, 0))
@@ -186,7 +218,18 @@ class App:
             self.status.config(text="Carpeta no válida.")
             return
 
-        titles, pdfs = list_pdf_titles(path)
+        if self.sections_var.get():
+            index = self._consolidated_index(path)
+            if not len(index):
+                self.status.config(text="No se encontraron PDFs en las subcarpetas.")
+                messagebox.showinfo("Sin PDFs", "No se encontraron archivos .pdf en las subcarpetas.")
+                return
+            for kind, text in index.iter_lines():
+                self.listbox.insert(tk.END, text if kind == "heading" else f"    {text}")
+            self.status.config(text=f"Encontrados {len(index)} PDFs en {len(index.sections)} secciones.")
+            return
+
+        titles, pdfs = self._list_titles(path)
         if not pdfs:
             self.status.config(text="No se encontraron PDFs en la carpeta.")
             messagebox.showinfo("Sin PDFs", "No se encontraron archivos .pdf en la carpeta seleccionada.")
@@ -203,19 +246,31 @@ class App:
             messagebox.showwarning("Carpeta no válida", "Selecciona una carpeta válida.")
             return
 
-        if not (self.export_docx_var.get() or self.export_pdf_var.get()):
-            messagebox.showwarning("Seleccione formato", "Selecciona al menos un formato (Word o PDF).")
+        formats = [fmt for fmt, var in (
+            ("docx", self.export_docx_var),
+            ("pdf", self.export_pdf_var),
+            ("csv", self.export_csv_var),
+            ("html", self.export_html_var),
+            ("json", self.export_json_var),
+        ) if var.get()]
+        if not formats:
+            messagebox.showwarning("Seleccione formato", "Selecciona al menos un formato de salida.")
             return
 
-        titles, pdfs = list_pdf_titles(src_dir)
-        if not titles:
-            messagebox.showinfo("Sin PDFs", "No se encontraron archivos .pdf en la carpeta seleccionada.")
-            return
+        if self.sections_var.get():
+            source = self._consolidated_index(src_dir)
+            if not len(source):
+                messagebox.showinfo("Sin PDFs", "No se encontraron archivos .pdf en las subcarpetas.")
+                return
+        else:
+            source, pdfs = self._list_titles(src_dir)
+            if not source:
+                messagebox.showinfo("Sin PDFs", "No se encontraron archivos .pdf en la carpeta seleccionada.")
+                return
         
         dest_dir = self._resolve_output_dir(src_dir)
 
         base = (self.output_basename.get().strip() or "Indice_Documentos")
-        generated = []
 
         header_kwargs = dict(
             title_text=(self.doc_title_var.get().strip() or "Índice de Documentos"),
@@ -228,15 +283,8 @@ class App:
         )
 
         try:
-            if self.export_docx_var.get():
-                out_docx = dest_dir / f"{base}.docx"
-                export_docx(titles, out_docx, **header_kwargs)
-                generated.append(out_docx)
-
-            if self.export_pdf_var.get():
-                out_pdf = dest_dir / f"{base}.pdf"
-                export_pdf(titles, out_pdf, **header_kwargs)
-                generated.append(out_pdf)
+            prepared = prepare_index(source, resolve_pdf_font="pdf" in formats, **header_kwargs)
+            generated = export_all(prepared, dest_dir, base, formats)
 
         except ImportError as e:
             messagebox.showerror("Dependencia faltante", str(e))
@@ -250,6 +298,27 @@ class App:
         messagebox.showinfo("Índice creado", "Generado:\n" + "\n".join(str(p) for p in generated))
         self.status.config(text=f"Índice creado correctamente en: {dest_dir}")
 
+    def _list_titles(self, directory: Path):
+        return list_pdf_titles(
+            directory,
+            sort=self.sort_mode_var.get(),
+            reverse=bool(self.sort_reverse_var.get()),
+        )
+
+    def _consolidated_index(self, root: Path):
+        # Los PDFs sueltos en la raíz van primero, en una sección con el nombre de la carpeta
+        folders = [root] + section_folders(root)
+        return build_consolidated_index(
+            folders,
+            sort=self.sort_mode_var.get(),
+            reverse=bool(self.sort_reverse_var.get()),
+        )
+
+    def _rescan_if_ready(self):
+        path = Path(self.directory.get().strip())
+        if self.directory.get().strip() and path.is_dir():
+            self.scan_folder()
+
     def _resolve_output_dir(self, src_dir: Path) -> Path:
         chosen = self.output_dir.get().strip()
         dest = Path(chosen) if chosen else src_dir
@@ -1,6 +1,21 @@
+import copy
+import csv
 import datetime
+import html
+import json
+import os
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .indexing import ENTRY_FORMAT, ConsolidatedIndex
+
+# Each rendered line is (kind, text) with kind "heading" (section) or "entry" (document)
+IndexLine = Tuple[str, str]
 
 # ---- Helpers PDF font registration ----
 _BASE14 = {"Helvetica", "Times-Roman", "Courier"}
@@ -33,22 +48,186 @@ def _register_pdf_font_id_needed(font_name: str) -> str:
     except Exception:
         return "Helvetica"
 
+def _ensure_pdf_font(resolved: str) -> str:
+    """
+    Cheap path for a font already resolved by prepare_index(); registers it
+    again only if the current process (e.g. a pool worker) hasn't seen it.
+    """
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        if resolved in _BASE14 or resolved in pdfmetrics.getRegisteredFontNames():
+            return resolved
+    except Exception:
+        return "Helvetica"
+    return _register_pdf_font_id_needed(resolved)
+
+# ---- Prepared index (shared by every output format) ----
+@dataclass(frozen=True)
+class IndexRecord:
+    section: str
+    number: int
+    title: str
+
+@dataclass(frozen=True)
+class PreparedIndex:
+    """
+    Everything the renderers need, computed once: formatted lines, structured
+    records, the date string and the resolved PDF font. Immutable and picklable,
+    so it can be shared across threads or sent to worker processes.
+    """
+    lines: Tuple[IndexLine, ...]
+    records: Tuple[IndexRecord, ...]
+    title_text: str = "Índice de Documentos"
+    show_title: bool = True
+    show_date: bool = True
+    title_align: str = "center"
+    font_name: str = "Calibri"
+    pdf_font: Optional[str] = None
+    title_font_size: int = 18
+    body_font_size: int = 11
+    date_text: str = ""
+
+def prepare_index(
+    source: Union[Sequence[str], ConsolidatedIndex],
+    *,
+    title_text: str = "Índice de Documentos",
+    show_title: bool = True,
+    show_date: bool = True,
+    title_align: str = "center", # left / center / right
+    font_name: str = "Calibri",
+    title_font_size: int = 18,
+    body_font_size: int = 11,
+    entry_format: str = ENTRY_FORMAT,
+    resolve_pdf_font: bool = True,
+) -> PreparedIndex:
+    """
+    Normalize a flat title list or a ConsolidatedIndex into a PreparedIndex.
+    Flat lists keep their plain titles; consolidated entries use `entry_format`.
+    Pass resolve_pdf_font=False when no PDF will be rendered (skips the font lookup).
+    """
+    if isinstance(source, ConsolidatedIndex):
+        # Same lines as the on-screen preview, so both always agree
+        lines: Tuple[IndexLine, ...] = tuple(source.iter_lines(entry_format))
+        records = tuple(
+            IndexRecord(section.heading, e.number, e.title)
+            for section in source.sections for e in section.entries
+        )
+    else:
+        lines = tuple(("entry", f"{t}") for t in source)
+        records = tuple(IndexRecord("", i, f"{t}") for i, t in enumerate(source, start=1))
+
+    return PreparedIndex(
+        lines=lines,
+        records=records,
+        title_text=title_text,
+        show_title=show_title,
+        show_date=show_date,
+        title_align=title_align,
+        font_name=font_name,
+        pdf_font=_register_pdf_font_id_needed(font_name) if resolve_pdf_font else None,
+        title_font_size=int(title_font_size),
+        body_font_size=int(body_font_size),
+        date_text=datetime.date.today().strftime("%d/%m/%Y"),
+    )
+
+def _current_umask() -> int:
+    # os.umask() can only be read by setting it, so do it once at import time
+    # rather than from the export threads
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+_UMASK = _current_umask()
+
+@contextmanager
+def _atomic_output(out_path: Path) -> Iterator[Path]:
+    """
+    Yield a temp path next to `out_path` and move it into place only on success,
+    so a crash never leaves a half-written index behind.
+    """
+    out_path = Path(out_path)
+    fd, tmp = tempfile.mkstemp(dir=out_path.parent, prefix=f".{out_path.stem}.", suffix=out_path.suffix + ".tmp")
+    os.close(fd)
+    try:
+        yield Path(tmp)
+        # mkstemp creates 0600 files; give the index the permissions a plain
+        # open() would (or keep those of the index being replaced)
+        try:
+            mode = stat.S_IMODE(os.stat(out_path).st_mode)
+        except OSError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
 # ---- DOCX ----
 def export_docx(
-    titles: List[str], 
+    titles: List[str],
+    out_path: Path,
+    *,
+    title_text: str = "Índice de Documentos",
+    show_title: bool = True,
+    show_date: bool = True,
+    title_align: str = "center", # left / center / right
+    font_name: str = "Calibri",
+    title_font_size: int = 18,
+    body_font_size: int = 11,
+) -> None:
+    prepared = prepare_index(
+        titles,
+        title_text=title_text,
+        show_title=show_title,
+        show_date=show_date,
+        title_align=title_align,
+        font_name=font_name,
+        title_font_size=title_font_size,
+        body_font_size=body_font_size,
+        resolve_pdf_font=False,
+    )
+    render("docx", prepared, out_path)
+
+def export_index_docx(
+    index: ConsolidatedIndex,
     out_path: Path,
     *,
     title_text: str = "Índice de Documentos",
     show_title: bool = True,
     show_date: bool = True,
-    title_align: str = "center", # left / center / right    
+    title_align: str = "center",
     font_name: str = "Calibri",
     title_font_size: int = 18,
     body_font_size: int = 11,
+    entry_format: str = ENTRY_FORMAT,
 ) -> None:
+    """Consolidated index: section headings + globally numbered entries."""
+    prepared = prepare_index(
+        index,
+        title_text=title_text,
+        show_title=show_title,
+        show_date=show_date,
+        title_align=title_align,
+        font_name=font_name,
+        title_font_size=title_font_size,
+        body_font_size=body_font_size,
+        entry_format=entry_format,
+        resolve_pdf_font=False,
+    )
+    render("docx", prepared, out_path)
+
+def _render_docx(prepared: PreparedIndex, out_path: Path) -> None:
     from docx import Document
     from docx.shared import Pt, Cm
     from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.oxml.ns import qn
+
+    font_name = prepared.font_name
+    title_align = prepared.title_align
+    body_font_size = prepared.body_font_size
 
     doc = Document()
 
@@ -64,17 +243,17 @@ def export_docx(
         "right": WD_ALIGN_PARAGRAPH.RIGHT,
     }
 
-    if show_title:
+    if prepared.show_title:
         h = doc.add_paragraph()
-        run = h.add_run(title_text)
+        run = h.add_run(prepared.title_text)
         run.bold = True
-        run.font.size = Pt(int(title_font_size))
+        run.font.size = Pt(prepared.title_font_size)
         run.font.name = font_name
         h.alignment = align_map.get(title_align, WD_ALIGN_PARAGRAPH.CENTER)
         
-    if show_date:
+    if prepared.show_date:
         date_p = doc.add_paragraph()
-        date_run = date_p.add_run(datetime.date.today().strftime("%d/%m/%Y"))
+        date_run = date_p.add_run(prepared.date_text)
         date_run.italic = True
         date_run.font.name = font_name
         date_run.font.size = Pt(max(9, int(body_font_size) - 1))
@@ -82,18 +261,69 @@ def export_docx(
 
     doc.add_paragraph()
 
-    for t in titles:
-        para = doc.add_paragraph(f"{t}")
-        para.paragraph_format.space_after = Pt(4)
+    def make_template(kind: str):
+        para = doc.add_paragraph("x")
+        if kind == "heading":
+            para.paragraph_format.space_before = Pt(10)
+            para.paragraph_format.space_after = Pt(6)
+        else:
+            para.paragraph_format.space_after = Pt(4)
         for run in para.runs:
             run.font.name = font_name
-            run.font.size = Pt(int(body_font_size))
+            if kind == "heading":
+                run.bold = True
+                run.font.size = Pt(int(body_font_size) + 1)
+            else:
+                run.font.size = Pt(int(body_font_size))
+        p = para._p
+        p.getparent().remove(p)
+        return p
+
+    # doc.add_paragraph() scans the body for <w:sectPr> on every call, which is
+    # quadratic for large indexes. Clone one styled paragraph per kind instead
+    # and insert it straight before the section properties.
+    templates = {"entry": make_template("entry"), "heading": make_template("heading")}
+    body = doc.element.body
+    anchor = body.sectPr
+    for kind, t in prepared.lines:
+        p = copy.deepcopy(templates.get(kind, templates["entry"]))
+        text_el = p.find(".//" + qn("w:t"))
+        text_el.text = f"{t}"
+        text_el.set(qn("xml:space"), "preserve")
+        if anchor is not None:
+            anchor.addprevious(p)
+        else:
+            body.append(p)
 
     doc.save(out_path)
 
 # ---- PDF ----
 def export_pdf(
-    titles: List[str], 
+    titles: List[str],
+    out_path: Path,
+    *,
+    title_text: str = "Índice de Documentos",
+    show_title: bool = True,
+    show_date: bool = True,
+    title_align: str = "center",
+    font_name: str = "Helvetica",
+    title_font_size: int = 18,
+    body_font_size: int = 11,
+) -> None:
+    prepared = prepare_index(
+        titles,
+        title_text=title_text,
+        show_title=show_title,
+        show_date=show_date,
+        title_align=title_align,
+        font_name=font_name,
+        title_font_size=title_font_size,
+        body_font_size=body_font_size,
+    )
+    render("pdf", prepared, out_path)
+
+def export_index_pdf(
+    index: ConsolidatedIndex,
     out_path: Path,
     *,
     title_text: str = "Índice de Documentos",
@@ -103,7 +333,23 @@ def export_pdf(
     font_name: str = "Helvetica",
     title_font_size: int = 18,
     body_font_size: int = 11,
+    entry_format: str = ENTRY_FORMAT,
 ) -> None:
+    """Consolidated index: section headings + globally numbered entries."""
+    prepared = prepare_index(
+        index,
+        title_text=title_text,
+        show_title=show_title,
+        show_date=show_date,
+        title_align=title_align,
+        font_name=font_name,
+        title_font_size=title_font_size,
+        body_font_size=body_font_size,
+        entry_format=entry_format,
+    )
+    render("pdf", prepared, out_path)
+
+def _render_pdf(prepared: PreparedIndex, out_path: Path) -> None:
     from reportlab.lib.pagesizes import A4
     from reportlab.pdfgen import canvas
     from reportlab.lib.units import cm
@@ -115,9 +361,12 @@ def export_pdf(
     left_margin = 2.5 * cm
     y = height - top_margin
 
-    usable_font = _register_pdf_font_id_needed(font_name)
+    title_align = prepared.title_align
+    body_font_size = prepared.body_font_size
+    # Title, date and body all use the resolved font (falls back to Helvetica)
+    font_name = _ensure_pdf_font(prepared.pdf_font or prepared.font_name)
 
-    def draw_title_line(text: str, size: int = 18):
+    def draw_header_line(text: str, size: int):
         c.setFont(font_name, int(size))
         if title_align == "left":
             c.drawString(left_margin, y, text)
@@ -126,32 +375,136 @@ def export_pdf(
         else:
             c.drawCentredString(width / 2, y, text)
 
-    def draw_date_line(text: str, size: int = 10):
-        c.setFont(usable_font, int(size))
-        if title_align == "left":
-            c.drawString(left_margin, y, text)
-        elif title_align == "right":
-            c.drawRightString(width - left_margin, y, text)
-        else:
-            c.drawCentredString(width / 2, y, text)
-    
-    if show_title:
-        draw_title_line(title_text, title_font_size)
+    if prepared.show_title:
+        draw_header_line(prepared.title_text, prepared.title_font_size)
         y -= 0.9 * cm
 
-    if show_date:
-        draw_date_line(datetime.date.today().strftime("%d/%m/%Y"), max(9, int(body_font_size) - 1))
+    if prepared.show_date:
+        draw_header_line(prepared.date_text, max(9, int(body_font_size) - 1))
         y -= 1.0 * cm
 
     c.setFont(font_name, body_font_size)
     line_height = 0.6 * cm
-    for t in titles:
+    for kind, t in prepared.lines:
+        if kind == "heading":
+            y -= 0.3 * cm
         if y < 2.5 * cm:
             c.showPage()
             y = height - top_margin
             c.setFont(font_name, body_font_size)
+        if kind == "heading":
+            c.setFont(font_name, int(body_font_size) + 1)
+            c.drawString(left_margin, y, f"{t}")
+            c.line(left_margin, y - 0.15 * cm, width - left_margin, y - 0.15 * cm)
+            c.setFont(font_name, body_font_size)
+            y -= line_height + 0.1 * cm
+            continue
         c.drawString(left_margin, y, f"{t}")
         y -= line_height
 
     c.showPage()
-    c.save()
\ No newline at end of file
+    c.save()
+
+# ---- CSV / HTML / JSON ----
+def _render_csv(prepared: PreparedIndex, out_path: Path) -> None:
+    # utf-8-sig + ";" so Excel with Spanish locale opens it with accents intact
+    with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["seccion", "numero", "titulo"])
+        writer.writerows((r.section, r.number, r.title) for r in prepared.records)
+
+def _render_html(prepared: PreparedIndex, out_path: Path) -> None:
+    esc = html.escape
+    align = prepared.title_align if prepared.title_align in ("left", "center", "right") else "center"
+    parts = [
+        "<!DOCTYPE html>",
+        '<html lang="es"><head><meta charset="utf-8">',
+        f"<title>{esc(prepared.title_text)}</title>",
+        "<style>"
+        f"body{{font-family:'{esc(prepared.font_name)}',sans-serif;font-size:{prepared.body_font_size}pt;margin:2.5cm}}"
+        f"h1{{font-size:{prepared.title_font_size}pt;text-align:{align}}}"
+        f".date{{font-style:italic;text-align:{align}}}"
+        "ul{list-style:none;padding:0}li{margin-bottom:4pt}"
+        "h2{font-size:1.1em;border-bottom:1px solid #000}"
+        "</style></head><body>",
+    ]
+    if prepared.show_title:
+        parts.append(f"<h1>{esc(prepared.title_text)}</h1>")
+    if prepared.show_date:
+        parts.append(f'<p class="date">{esc(prepared.date_text)}</p>')
+
+    in_list = False
+    for kind, t in prepared.lines:
+        if kind == "heading":
+            if in_list:
+                parts.append("</ul>")
+            parts.append(f"<h2>{esc(t)}</h2>")
+            parts.append("<ul>")
+            in_list = True
+            continue
+        if not in_list:
+            parts.append("<ul>")
+            in_list = True
+        parts.append(f"<li>{esc(t)}</li>")
+    if in_list:
+        parts.append("</ul>")
+    parts.append("</body></html>")
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+
+def _render_json(prepared: PreparedIndex, out_path: Path) -> None:
+    payload = {
+        "title": prepared.title_text,
+        "date": prepared.date_text if prepared.show_date else None,
+        "entries": [{"section": r.section, "number": r.number, "title": r.title} for r in prepared.records],
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+# ---- Orchestration ----
+_RENDERERS: Dict[str, Callable[[PreparedIndex, Path], None]] = {
+    "docx": _render_docx,
+    "pdf": _render_pdf,
+    "csv": _render_csv,
+    "html": _render_html,
+    "json": _render_json,
+}
+EXPORT_FORMATS = tuple(_RENDERERS)
+
+def render(fmt: str, prepared: PreparedIndex, out_path: Path) -> Path:
+    """Render one format atomically (temp file + rename). Returns `out_path`."""
+    try:
+        renderer = _RENDERERS[fmt]
+    except KeyError:
+        raise ValueError(f"Unsupported export format: {fmt!r}") from None
+    with _atomic_output(Path(out_path)) as tmp:
+        renderer(prepared, tmp)
+    return Path(out_path)
+
+def export_all(
+    prepared: PreparedIndex,
+    out_dir: Path,
+    basename: str,
+    formats: Sequence[str],
+    *,
+    max_workers: Optional[int] = None,
+) -> List[Path]:
+    """
+    Render every requested format concurrently from the same PreparedIndex.
+    Each file is written atomically; if any format fails the others still
+    complete and the first error is re-raised afterwards.
+    """
+    unknown = [f for f in formats if f not in _RENDERERS]
+    if unknown:
+        raise ValueError(f"Unsupported export format(s): {', '.join(unknown)}")
+
+    out_dir = Path(out_dir)
+    with ThreadPoolExecutor(max_workers=max_workers or len(formats) or 1) as pool:
+        futures = [pool.submit(render, fmt, prepared, out_dir / f"{basename}.{fmt}") for fmt in formats]
+        errors = [f.exception() for f in futures]
+
+    for err in errors:
+        if err is not None:
+            raise err
+    return [f.result() for f in futures]
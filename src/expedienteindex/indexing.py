@@ -1,14 +1,98 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Sequence, Tuple
 
-def list_pdf_titles(directory: Path) -> Tuple[List[str], List[Path]]:
+from .sorting import DEFAULT_SORT_MODE, natural_key, sort_dir_entries
+
+ENTRY_FORMAT = "{number}. {title}"
+
+def list_pdf_titles(
+    directory: Path,
+    *,
+    sort: str = DEFAULT_SORT_MODE,
+    reverse: bool = False,
+) -> Tuple[List[str], List[Path]]:
     """
-    Devuelve una tupla (titles, path) con los títulos (stem) ordenados alfabéticamente
-    y la lista de rutas de PDFs.
+    Devuelve una tupla (titles, path) con los títulos (stem) ordenados según `sort`
+    (orden natural por defecto, ver sorting.SORT_MODES) y la lista de rutas de PDFs.
+    La extensión .pdf se reconoce sin distinguir mayúsculas.
     """
-    pdfs = sorted(
-        [p for p in directory.glob("*.pdf") if p.is_file()],
-        key=lambda p: p.name.lower()
-    )
+    with os.scandir(directory) as it:
+        found = [
+            entry for entry in it
+            if entry.name.lower().endswith(".pdf") and entry.is_file()
+        ]
+
+    # Se conservan los DirEntry para que "mtime"/"size" usen su stat() cacheado
+    pdfs = sort_dir_entries(found, sort, reverse=reverse)
+    return [p.stem for p in pdfs], pdfs
+
+# ---- Índice consolidado (secciones -> documentos) ----
+@dataclass
+class IndexEntry:
+    number: int
+    title: str
+    path: Path
+
+@dataclass
+class IndexSection:
+    heading: str
+    folder: Path
+    entries: List[IndexEntry] = field(default_factory=list)
+
+@dataclass
+class ConsolidatedIndex:
+    sections: List[IndexSection] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return sum(len(s.entries) for s in self.sections)
+
+    def iter_lines(self, entry_format: str = ENTRY_FORMAT) -> Iterator[Tuple[str, str]]:
+        """
+        Recorre el índice una sola vez produciendo ("heading", texto) por sección
+        y ("entry", texto) por documento, listo para los exportadores.
+        """
+        for section in self.sections:
+            yield "heading", section.heading
+            for e in section.entries:
+                yield "entry", entry_format.format(number=e.number, title=e.title)
+
+def section_folders(root: Path) -> List[Path]:
+    """Subcarpetas directas de `root` en orden natural (cada una será una sección)."""
+    with os.scandir(root) as it:
+        dirs = [Path(entry.path) for entry in it if entry.is_dir() and not entry.name.startswith(".")]
+    return sorted(dirs, key=lambda p: natural_key(p.name))
+
+def build_consolidated_index(
+    folders: Sequence[Path],
+    *,
+    headings: Optional[Sequence[str]] = None,
+    sort: str = DEFAULT_SORT_MODE,
+    reverse: bool = False,
+    start: int = 1,
+    skip_empty: bool = True,
+    max_workers: Optional[int] = None,
+) -> ConsolidatedIndex:
+    """
+    Escanea varias carpetas en paralelo y construye un índice con una sección por
+    carpeta (en el orden recibido) y numeración global consecutiva desde `start`.
+    """
+    if headings is not None and len(headings) != len(folders):
+        raise ValueError("Debe haber un encabezado por carpeta.")
+
+    folders = [Path(f) for f in folders]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        scans = list(pool.map(lambda f: list_pdf_titles(f, sort=sort, reverse=reverse), folders))
 
-    return [p.stem for p in pdfs], pdfs
\ No newline at end of file
+    index = ConsolidatedIndex()
+    number = start
+    for i, (folder, (titles, pdfs)) in enumerate(zip(folders, scans)):
+        if skip_empty and not pdfs:
+            continue
+        heading = headings[i] if headings is not None else folder.name
+        entries = [IndexEntry(n, t, p) for n, t, p in zip(range(number, number + len(pdfs)), titles, pdfs)]
+        number += len(entries)
+        index.sections.append(IndexSection(heading, folder, entries))
+    return index
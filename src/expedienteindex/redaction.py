@@ -0,0 +1,245 @@
+"""
+Anonimización de PDFs a partir de las entidades que detecta NEREngine.
+
+Cada página se extrae, se analiza y se escribe de una en una, así que el NER
+solo ve el texto de una página cada vez. La memoria sí crece con el documento:
+reportlab guarda todas las páginas hasta save() y PdfReader conserva las ya
+leídas (del orden de 30 MB para 1.000 páginas). La copia resultante contiene
+solo el texto de la página (sin imágenes ni maquetación original), con los
+caracteres de cada entidad sustituidos y tapados con una caja negra: el dato
+original no queda en el PDF ni al copiar/pegar.
+
+Las páginas sin texto extraíble (escaneos, imágenes) no se pueden anonimizar:
+salen con un aviso en lugar del contenido y se cuentan en `empty_pages`.
+
+El nombre del archivo también puede contener datos personales, así que las
+copias se nombran por posición (Documento_001_anonimizado.pdf...) y la relación
+con los originales se guarda en MAPPING_FILENAME, en la misma carpeta. Ese
+fichero contiene los nombres originales: no debe entregarse con las copias.
+
+Ejecutar con: python -m expedienteindex.redaction <carpeta> <carpeta_salida>
+"""
+import argparse
+import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .indexing import list_pdf_titles
+from .nlp.ner import DetectedEntity
+
+DEFAULT_LABELS = frozenset({"PERSON", "ID_NUMBER", "EMAIL", "PHONE"})
+MASK_CHAR = "X"
+EMPTY_PAGE_NOTICE = "[Página sin texto extraíble: contenido omitido en la copia anonimizada]"
+MAPPING_FILENAME = "correspondencia.csv"
+
+Detector = Callable[[str], List[DetectedEntity]]
+
+
+@dataclass
+class RedactionResult:
+    source: Path
+    output: Path
+    pages: int = 0
+    empty_pages: int = 0
+    entities: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def merge_spans(entities: Iterable[DetectedEntity], labels: Iterable[str] = DEFAULT_LABELS) -> List[Tuple[int, int]]:
+    """Devuelve los intervalos (start, end) a tapar, ordenados y sin solapes."""
+    wanted = set(labels)
+    spans = sorted((e.start, e.end) for e in entities if e.label in wanted and e.end > e.start)
+    merged: List[Tuple[int, int]] = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def mask_text(text: str, spans: Sequence[Tuple[int, int]]) -> str:
+    """Sustituye los caracteres de cada intervalo (salvo saltos de línea) por MASK_CHAR."""
+    chars = list(text)
+    for start, end in spans:
+        for i in range(start, min(end, len(chars))):
+            if chars[i] not in "\r\n":
+                chars[i] = MASK_CHAR
+    return "".join(chars)
+
+
+def _layout_lines(text: str, max_width: float, width_of: Callable[[str], float]) -> Iterable[Tuple[int, str]]:
+    """
+    Parte el texto de la página en líneas que caben en `max_width`.
+    Devuelve (offset, línea) para poder situar los intervalos de cada entidad.
+    """
+    offset = 0
+    for raw in text.splitlines(keepends=True):
+        line = raw.rstrip("\r\n")
+        start = 0
+        while True:
+            end, used = start, 0.0
+            while end < len(line):
+                w = width_of(line[end])
+                if used + w > max_width and end > start:
+                    break
+                used += w
+                end += 1
+            yield offset + start, line[start:end]
+            if end >= len(line):
+                break
+            start = end
+        offset += len(raw)
+
+
+def output_names(sources: Sequence[Path], suffix: str = "_anonimizado") -> List[str]:
+    """Nombres de salida por posición (1, 2...), sin nada del nombre original."""
+    width = max(3, len(str(len(sources))))
+    return [f"Documento_{i:0{width}d}{suffix}.pdf" for i in range(1, len(sources) + 1)]
+
+
+def write_mapping(out_dir: Path, sources: Sequence[Path], outputs: Sequence[Path]) -> Path:
+    """Escribe MAPPING_FILENAME (documento;original) en `out_dir` y devuelve su ruta."""
+    path = Path(out_dir) / MAPPING_FILENAME
+    # utf-8-sig + ";" como el CSV del índice, para abrirlo en Excel en español
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["documento", "original"])
+        writer.writerows((Path(o).name, Path(s).name) for s, o in zip(sources, outputs))
+    return path
+
+
+def redact_pdf(
+    src: Path,
+    dst: Path,
+    detect: Detector,
+    *,
+    labels: Iterable[str] = DEFAULT_LABELS,
+    font_name: str = "Helvetica",
+    font_size: int = 10,
+) -> RedactionResult:
+    """Escribe en `dst` una copia anonimizada de `src`, procesando página a página."""
+    from pypdf import PdfReader
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+
+    labels = frozenset(labels)
+    result = RedactionResult(source=Path(src), output=Path(dst))
+    width, height = A4
+    margin = 2 * cm
+    line_height = font_size * 1.35
+    width_of = lambda s: stringWidth(s, font_name, font_size)
+
+    reader = PdfReader(str(src))
+    c = canvas.Canvas(str(dst), pagesize=A4)
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if not text.strip():
+            # Escaneada o solo imagen: no hay nada que anonimizar, pero el usuario debe saberlo
+            result.empty_pages += 1
+            c.setFont(font_name, font_size)
+            c.drawString(margin, height - margin, EMPTY_PAGE_NOTICE)
+            c.showPage()
+            result.pages += 1
+            continue
+        ents = [e for e in detect(text) if e.label in labels]
+        for e in ents:
+            result.entities[e.label] = result.entities.get(e.label, 0) + 1
+        spans = merge_spans(ents, labels)
+        masked = mask_text(text, spans)
+
+        y = height - margin
+        c.setFont(font_name, font_size)
+        for line_start, line in _layout_lines(masked, width - 2 * margin, width_of):
+            if y < margin:
+                c.showPage()
+                c.setFont(font_name, font_size)
+                y = height - margin
+            c.drawString(margin, y, line)
+            line_end = line_start + len(line)
+            for s, e in spans:
+                if e <= line_start or s >= line_end:
+                    continue
+                a, b = max(s, line_start) - line_start, min(e, line_end) - line_start
+                x = margin + width_of(line[:a])
+                c.rect(x, y - font_size * 0.25, width_of(line[a:b]), font_size * 1.1, stroke=0, fill=1)
+            y -= line_height
+        c.showPage()
+        result.pages += 1
+
+    c.save()
+    return result
+
+
+def redact_folder(
+    directory: Path,
+    out_dir: Path,
+    *,
+    labels: Iterable[str] = DEFAULT_LABELS,
+    max_workers: Optional[int] = None,
+    prefer_small: bool = False,
+    suffix: str = "_anonimizado",
+) -> List[RedactionResult]:
+    """
+    Anonimiza en paralelo todos los PDFs de `directory` (según list_pdf_titles).
+    Cada proceso carga el modelo de spaCy una vez y lo reutiliza entre documentos.
+    """
+    from . import workers
+
+    _, pdfs = list_pdf_titles(directory)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    labels = sorted(labels)
+    outputs = {p: out_dir / name for p, name in zip(pdfs, output_names(pdfs, suffix))}
+    write_mapping(out_dir, pdfs, list(outputs.values()))
+
+    results: List[RedactionResult] = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=workers.init_worker,
+        initargs=(prefer_small,),
+    ) as pool:
+        futures = {
+            pool.submit(workers.redact_document, str(p), str(outputs[p]), labels): p
+            for p in pdfs
+        }
+        for fut in as_completed(futures):
+            src = futures[fut]
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                results.append(RedactionResult(source=src, output=outputs[src], error=str(e)))
+
+    order = {p: i for i, p in enumerate(pdfs)}
+    results.sort(key=lambda r: order.get(r.source, len(order)))
+    return results
+
+
+def main(argv=None) -> None:
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(prog="expedienteindex.redaction", description="Anonimiza los PDFs de una carpeta")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--labels", default=",".join(sorted(DEFAULT_LABELS)),
+                        help="etiquetas a tapar, separadas por comas")
+    args = parser.parse_args(argv)
+
+    labels = [l.strip() for l in args.labels.split(",") if l.strip()]
+    for r in redact_folder(args.directory, args.out_dir, labels=labels, max_workers=args.workers):
+        if r.error:
+            print(f"ERROR  {r.source.name}: {r.error}")
+        else:
+            total = sum(r.entities.values())
+            status = "AVISO " if r.empty_pages else "OK    "
+            empty = f", {r.empty_pages} sin texto (omitidas)" if r.empty_pages else ""
+            print(f"{status} {r.source.name} -> {r.output.name} ({r.pages} págs.{empty}, {total} entidades)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+"""
+Modo servicio: expone el escaneo de carpetas, la generación de índices y la
+detección de entidades (NER) a través de una API HTTP local basada en asyncio.
+
+Ejecutar con: python -m expedienteindex.service --port 8765
+
+Endpoints (cuerpo y respuestas en JSON; los POST exigen Content-Type: application/json
+y se rechaza cualquier petición con cabecera Origin):
+    GET  /health   estado del servicio
+    POST /scan     {"directory", "sort"?, "reverse"?}           -> NDJSON en streaming
+    POST /export   {"directory", "formats"? (docx/pdf/csv/html/json), "output_dir"?,
+                    "basename"?, "sort"?, opciones de cabecera} -> {"generated": [...]}
+    POST /ner      {"text", "use_regex"?, "include_email_phone"?} -> NDJSON en streaming
+    POST /redact   {"directory", "output_dir"? (por defecto <carpeta>_anonimizado al lado),
+                    "labels"? (lista)}                          -> NDJSON en streaming
+                   (copias Documento_NNN_anonimizado.pdf + correspondencia.csv)
+
+El trabajo de CPU (exportación y NER) va a un pool de procesos acotado; cada
+worker carga el modelo de spaCy una sola vez. Las peticiones esperan en una cola
+limitada y, si está llena, se responde 503 para que el cliente reintente.
+
+No hay más autenticación que un token compartido: por defecto solo se escucha en
+loopback, y para escuchar en otra interfaz es obligatorio definir el token
+(--token o EXPEDIENTEINDEX_TOKEN), que los clientes envían en la cabecera
+X-ExpedienteIndex-Token.
+"""
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import __app_name__, __version__, workers
+from .exporters import EXPORT_FORMATS, prepare_index
+from .indexing import list_pdf_titles
+from .redaction import DEFAULT_LABELS, output_names, write_mapping
+from .sorting import DEFAULT_SORT_MODE
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+TOKEN_HEADER = "X-ExpedienteIndex-Token"
+TOKEN_ENV = "EXPEDIENTEINDEX_TOKEN"
+DEFAULT_EXPORT_FORMATS = ("docx", "pdf")
+_HEADER_OPTIONS = (
+    "title_text", "show_title", "show_date", "title_align",
+    "font_name", "title_font_size", "body_font_size",
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+    def json(self) -> Dict[str, Any]:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"JSON no válido: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "El cuerpo debe ser un objeto JSON.")
+        return data
+
+
+# Un handler devuelve un dict (respuesta JSON) o un iterador asíncrono (NDJSON en streaming)
+Handler = Callable[[Request], Awaitable[Any]]
+
+
+class IndexService:
+    def __init__(self, *, max_workers: Optional[int] = None, queue_size: int = 32, prefer_small: bool = False,
+                 token: Optional[str] = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.token = token or None
+        self.queue_size = queue_size
+        self.prefer_small = prefer_small
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatchers: list = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._routes: Dict[Tuple[str, str], Handler] = {
+            ("GET", "/health"): self.handle_health,
+            ("POST", "/scan"): self.handle_scan,
+            ("POST", "/export"): self.handle_export,
+            ("POST", "/ner"): self.handle_ner,
+            ("POST", "/redact"): self.handle_redact,
+        }
+
+    # ---- Lifecycle ----
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        # El servicio lee y escribe carpetas arbitrarias: fuera de loopback exige token
+        if not _is_loopback(host) and not self.token:
+            raise ValueError(
+                f"Escuchar en '{host}' expone el servicio a la red: define un token "
+                f"(--token o la variable {TOKEN_ENV}) o usa 127.0.0.1."
+            )
+        self._pool = self._new_pool()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.max_workers)]
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=workers.init_worker,
+            initargs=(self.prefer_small,),
+        )
+
+    def _replace_broken_pool(self, broken: ProcessPoolExecutor) -> None:
+        # Varios dispatchers pueden ver el mismo pool roto: solo el primero lo sustituye
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+
+    @property
+    def port(self) -> int:
+        assert self._server is not None
+        return self._server.sockets[0].getsockname()[1]
+
+    # ---- Job queue ----
+    async def submit(self, fn: Callable, *args: Any, wait: bool = False) -> Any:
+        """
+        Encola una tarea para el pool de procesos. Si la cola está llena responde
+        503, salvo con `wait=True`, que espera turno (lotes de una misma petición).
+        """
+        assert self._queue is not None
+        fut = asyncio.get_running_loop().create_future()
+        if wait:
+            await self._queue.put((fn, args, fut))
+            return await fut
+        try:
+            self._queue.put_nowait((fn, args, fut))
+        except asyncio.QueueFull:
+            raise _busy() from None
+        return await fut
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, args, fut = await self._queue.get()
+            try:
+                if fut.cancelled():
+                    continue
+                try:
+                    result = await self._run_in_pool(loop, fn, args)
+                except Exception as e:
+                    if not fut.cancelled():
+                        fut.set_exception(e)
+                else:
+                    if not fut.cancelled():
+                        fut.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def _run_in_pool(self, loop: asyncio.AbstractEventLoop, fn: Callable, args: Tuple) -> Any:
+        """
+        Ejecuta la tarea en el pool. Si un worker muere (OOM, segfault...) el pool
+        queda inservible: se crea uno nuevo y la tarea se reintenta una sola vez.
+        """
+        for attempt in range(2):
+            pool = self._pool
+            try:
+                return await loop.run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                self._replace_broken_pool(pool)
+        raise RuntimeError("El proceso de trabajo terminó inesperadamente al procesar la petición.")
+
+    # ---- Handlers ----
+    async def handle_health(self, request: Request) -> Dict[str, Any]:
+        return {
+            "app": __app_name__,
+            "version": __version__,
+            "workers": self.max_workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def handle_scan(self, request: Request) -> AsyncIterator[Dict[str, Any]]:
+        data = request.json()
+        directory = _require_dir(data.get("directory"))
+        titles, pdfs = await asyncio.to_thread(
+            list_pdf_titles, directory,
+            sort=_str_field(data, "sort", DEFAULT_SORT_MODE),
+            reverse=_bool_field(data, "reverse", False),
+        )
+
+        async def stream():
+            for title, path in zip(titles, pdfs):
+                yield {"title": title, "path": str(path)}
+        return stream()
+
+    async def handle_export(self, request: Request) -> Dict[str, Any]:
+        data = request.json()
+        src_dir = _require_dir(data.get("directory"))
+        formats = _str_list_field(data, "formats", list(DEFAULT_EXPORT_FORMATS))
+        unknown = [f for f in formats if f not in EXPORT_FORMATS]
+        if unknown:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Formatos no soportados: {', '.join(unknown)}")
+        sort = _str_field(data, "sort", DEFAULT_SORT_MODE)
+        reverse = _bool_field(data, "reverse", False)
+        header_kwargs = {k: data[k] for k in _HEADER_OPTIONS if k in data}
+        for k in ("show_title", "show_date"):
+            if k in data:
+                header_kwargs[k] = _bool_field(data, k, True)
+
+        # La petición se admite (o se rechaza) entera; sus formatos esperan turno en la cola
+        if self._queue.full():
+            raise _busy()
+
+        titles, _ = await asyncio.to_thread(
+            list_pdf_titles, src_dir, sort=sort, reverse=reverse
+        )
+        if not titles:
+            raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, "No se encontraron archivos .pdf en la carpeta.")
+
+        dest_dir = Path(data.get("output_dir") or src_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        base = (str(data.get("basename") or "").strip() or "Indice_Documentos")
+        # Formatting, date and font resolution happen once; every format reuses them
+        prepared = await asyncio.to_thread(
+            prepare_index, titles, resolve_pdf_font="pdf" in formats, **header_kwargs
+        )
+
+        generated = await asyncio.gather(*(
+            self.submit(workers.export_index, fmt, prepared, str(dest_dir / f"{base}.{fmt}"), wait=True)
+            for fmt in formats
+        ))
+        return {"generated": list(generated), "count": len(titles)}
+
+    async def handle_ner(self, request: Request) -> AsyncIterator[Dict[str, Any]]:
+        data = request.json()
+        text = data.get("text")
+        if not isinstance(text, str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Falta el campo 'text'.")
+        ents = await self.submit(
+            workers.detect_entities, text,
+            _bool_field(data, "use_regex", True),
+            _bool_field(data, "include_email_phone", False),
+        )
+
+        async def stream():
+            for ent in ents:
+                yield ent
+        return stream()
+
+    async def handle_redact(self, request: Request) -> AsyncIterator[Dict[str, Any]]:
+        data = request.json()
+        src_dir = _require_dir(data.get("directory"))
+        # Por defecto en una carpeta hermana: dentro del expediente acabaría
+        # apareciendo como sección del índice consolidado
+        out_dir = Path(data.get("output_dir") or src_dir.parent / f"{src_dir.name}_anonimizado")
+        labels = _str_list_field(data, "labels", sorted(DEFAULT_LABELS))
+        if self._queue.full():
+            raise _busy()
+
+        _, pdfs = await asyncio.to_thread(list_pdf_titles, src_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        # Nombres por posición: el nombre original también puede llevar datos personales
+        outputs = [out_dir / name for name in output_names(pdfs)]
+        await asyncio.to_thread(write_mapping, out_dir, pdfs, outputs)
+
+        async def one(src: Path, dst: Path) -> Dict[str, Any]:
+            try:
+                r = await self.submit(workers.redact_document, str(src), str(dst), labels, wait=True)
+            except Exception as e:
+                return {"source": str(src), "output": str(dst), "error": str(e)}
+            return {
+                "source": str(r.source), "output": str(r.output), "pages": r.pages,
+                "empty_pages": r.empty_pages, "entities": r.entities,
+            }
+
+        async def stream():
+            # Como mucho max_workers documentos de esta petición en la cola a la vez:
+            # el siguiente se envía cuando termina uno, y el resto de clientes
+            # sigue encontrando hueco en la cola compartida
+            pending_docs = zip(pdfs, outputs)
+            in_flight: set = set()
+            try:
+                while True:
+                    while len(in_flight) < self.max_workers:
+                        doc = next(pending_docs, None)
+                        if doc is None:
+                            break
+                        in_flight.add(asyncio.ensure_future(one(*doc)))
+                    if not in_flight:
+                        break
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            finally:
+                for task in in_flight:
+                    task.cancel()
+        return stream()
+
+    # ---- HTTP plumbing ----
+    def _check_token(self, request: Request) -> None:
+        if self.token is None:
+            return
+        given = request.headers.get(TOKEN_HEADER.lower(), "")
+        if not hmac.compare_digest(given.encode("utf-8"), self.token.encode("utf-8")):
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, f"Falta o no es válida la cabecera {TOKEN_HEADER}.")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                request = await _read_request(reader)
+                _check_local_client(request)
+                self._check_token(request)
+                handler = self._routes.get((request.method, request.path))
+                if handler is None:
+                    raise HTTPError(HTTPStatus.NOT_FOUND, f"Ruta no encontrada: {request.method} {request.path}")
+                result = await handler(request)
+            except HTTPError as e:
+                await _write_json(writer, e.status, {"error": e.message}, e.headers)
+            except ValueError as e:
+                await _write_json(writer, HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            except Exception as e:
+                await _write_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+            else:
+                if isinstance(result, dict):
+                    await _write_json(writer, HTTPStatus.OK, result)
+                else:
+                    await _write_stream(writer, result)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # "" (todas las interfaces) o un nombre de host cualquiera
+        return False
+
+
+def _check_local_client(request: Request) -> None:
+    """
+    Bloquea peticiones de páginas web abiertas en el navegador: los navegadores
+    siempre envían Origin en peticiones entre sitios, y exigir application/json
+    obliga a un preflight CORS que este servidor nunca aprueba.
+    """
+    if "origin" in request.headers:
+        raise HTTPError(HTTPStatus.FORBIDDEN, "Peticiones desde navegador no permitidas.")
+    if request.method == "POST":
+        content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        if content_type != "application/json":
+            raise HTTPError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "El cuerpo debe enviarse como application/json.")
+
+
+def _busy() -> HTTPError:
+    return HTTPError(
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        "Servicio ocupado, inténtalo de nuevo en unos segundos.",
+        {"Retry-After": "1"},
+    )
+
+
+def _bool_field(data: Dict[str, Any], key: str, default: bool) -> bool:
+    """Booleano JSON real: "false" o 0 no se convierten en silencio."""
+    value = data.get(key, default)
+    if not isinstance(value, bool):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{key}' debe ser true o false.")
+    return value
+
+
+def _str_field(data: Dict[str, Any], key: str, default: str) -> str:
+    value = data.get(key, default)
+    if not isinstance(value, str):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{key}' debe ser texto.")
+    return value
+
+
+def _str_list_field(data: Dict[str, Any], key: str, default: List[str]) -> List[str]:
+    """Lista no vacía de textos; un texto suelto no se itera carácter a carácter."""
+    value = data.get(key)
+    if value is None:
+        return default
+    if not (isinstance(value, list) and value and all(isinstance(v, str) for v in value)):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{key}' debe ser una lista de textos.")
+    return value
+
+
+def _require_dir(value: Any) -> Path:
+    if not value:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Falta el campo 'directory'.")
+    path = Path(str(value))
+    if not path.is_dir():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Carpeta no válida: {path}")
+    return path
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Request:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Cabeceras demasiado grandes.")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Línea de petición no válida.")
+
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo de la petición demasiado grande.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target.split("?", 1)[0], headers, body)
+
+
+def _status_line(status: HTTPStatus, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _write_json(writer: asyncio.StreamWriter, status: HTTPStatus, payload: Dict[str, Any],
+                      extra_headers: Optional[Dict[str, str]] = None) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body))}
+    headers.update(extra_headers or {})
+    writer.write(_status_line(status, headers) + body)
+    await writer.drain()
+
+
+async def _write_stream(writer: asyncio.StreamWriter, items: AsyncIterator[Dict[str, Any]]) -> None:
+    headers = {"Content-Type": "application/x-ndjson; charset=utf-8", "Transfer-Encoding": "chunked"}
+    writer.write(_status_line(HTTPStatus.OK, headers))
+    async for item in items:
+        line = (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+        writer.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        # drain() aplica contrapresión si el cliente lee más despacio de lo que generamos
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def serve(host: str, port: int, *, max_workers: Optional[int] = None, queue_size: int = 32,
+                prefer_small: bool = False, token: Optional[str] = None) -> None:
+    service = IndexService(max_workers=max_workers, queue_size=queue_size, prefer_small=prefer_small, token=token)
+    server = await service.start(host, port)
+    print(f"{__app_name__} v{__version__} escuchando en http://{host}:{service.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None) -> None:
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(prog="expedienteindex.service", description="API HTTP local de ExpedienteIndex")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="procesos para exportación/NER (por defecto: nº de CPUs)")
+    parser.add_argument("--queue-size", type=int, default=32, help="peticiones en espera antes de responder 503")
+    parser.add_argument("--prefer-small", action="store_true", help="usar es_core_news_sm si está disponible")
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                        help=f"token compartido exigido en {TOKEN_HEADER}; obligatorio fuera de loopback "
+                             f"(mejor vía {TOKEN_ENV}, no queda a la vista en la lista de procesos)")
+    args = parser.parse_args(argv)
+    if not _is_loopback(args.host) and not args.token:
+        parser.error(f"--host {args.host} no es loopback: define --token o {TOKEN_ENV}")
+    try:
+        asyncio.run(serve(args.host, args.port, max_workers=args.workers, queue_size=args.queue_size,
+                          prefer_small=args.prefer_small, token=args.token))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Modos de ordenación disponibles (el primero es el predeterminado)
+SORT_MODES = ("natural", "number", "mtime", "size", "alpha")
+DEFAULT_SORT_MODE = SORT_MODES[0]
+
+_DIGITS_RE = re.compile(r"(\d+)")
+# "03 - Demanda", "Doc 12", "Documento nº 4", "Doc. n.º 7 Poder", "Nº 4", "N.º 7"...
+# El prefijo "doc"/"documento" y la marca "nº" son opcionales e independientes
+_LEADING_NUMBER_RE = re.compile(
+    r"^\s*(?:doc(?:umento)?\.?\s*)?(?:n\.?\s*[º°o]\.?\s*)?(\d+)",
+    re.IGNORECASE,
+)
+# La ñ es una letra propia en español: va después de toda la "n" y antes de la "o"
+_ENYE_KEY = "n\U0010ffff"
+
+
+def collation_key(text: str) -> str:
+    """
+    Clave de comparación al estilo español: sin distinción de mayúsculas,
+    sin tildes ni diéresis, y con la ñ entre la n y la o.
+    """
+    folded = unicodedata.normalize("NFC", text).casefold().replace("ñ", "\x00")
+    decomposed = unicodedata.normalize("NFD", folded)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    # La "ñ" descompuesta sería n + tilde; la protegemos antes y la restauramos aquí
+    return stripped.replace("\x00", _ENYE_KEY)
+
+
+def natural_key(text: str) -> Tuple[Tuple, ...]:
+    """
+    Clave de orden natural: los bloques numéricos se comparan por su valor,
+    de modo que "Doc 2" va antes que "Doc 10". Los números van antes que el texto.
+    """
+    parts = []
+    for i, chunk in enumerate(_DIGITS_RE.split(collation_key(text))):
+        if not chunk:
+            continue
+        if i % 2:
+            parts.append((0, int(chunk), ""))
+        else:
+            parts.append((1, 0, chunk))
+    return tuple(parts)
+
+
+def leading_number(text: str):
+    """Devuelve el número de documento al inicio del título, o None si no lo tiene."""
+    m = _LEADING_NUMBER_RE.match(text)
+    return int(m.group(1)) if m else None
+
+
+def _name_tiebreak(p: Path) -> Tuple:
+    # Desempate estable y determinista para nombres que colacionan igual
+    return natural_key(p.stem), p.name.casefold(), p.name
+
+
+def _number_key(p: Path) -> Tuple:
+    n = leading_number(p.stem)
+    return (n is None, n or 0, _name_tiebreak(p))
+
+
+# Cada clave recibe la ruta y una función que devuelve su stat(); solo los
+# modos "mtime" y "size" la llaman
+StatGetter = Callable[[], os.stat_result]
+
+_KEY_FUNCS: Dict[str, Callable[[Path, StatGetter], Tuple]] = {
+    "natural": lambda p, stat: _name_tiebreak(p),
+    "number": lambda p, stat: _number_key(p),
+    "mtime": lambda p, stat: (stat().st_mtime, _name_tiebreak(p)),
+    "size": lambda p, stat: (stat().st_size, _name_tiebreak(p)),
+    "alpha": lambda p, stat: (collation_key(p.name), p.name),
+}
+
+
+def _sorted_decorated(items: Iterable[Tuple[Path, StatGetter]], mode: str, reverse: bool) -> List[Path]:
+    try:
+        key_func = _KEY_FUNCS[mode]
+    except KeyError:
+        raise ValueError(
+            f"Modo de ordenación desconocido: {mode!r}. Disponibles: {', '.join(SORT_MODES)}"
+        ) from None
+
+    decorated = [(key_func(p, stat), p) for p, stat in items]
+    decorated.sort(key=lambda item: item[0], reverse=reverse)
+    return [p for _, p in decorated]
+
+
+def sort_paths(paths: Iterable[Path], mode: str = DEFAULT_SORT_MODE, *, reverse: bool = False) -> List[Path]:
+    """
+    Ordena rutas según `mode` (ver SORT_MODES).
+
+    La clave de cada entrada se calcula una única vez (decorate-sort), así que
+    en los modos "mtime" y "size" solo se hace un stat() por archivo.
+    """
+    return _sorted_decorated(((p, p.stat) for p in paths), mode, reverse)
+
+
+def sort_dir_entries(entries: Iterable[os.DirEntry], mode: str = DEFAULT_SORT_MODE, *,
+                     reverse: bool = False) -> List[Path]:
+    """
+    Como sort_paths, pero a partir de entradas de os.scandir: DirEntry.stat()
+    reutiliza los datos del listado (gratis en Windows, cacheado en el resto).
+    """
+    return _sorted_decorated(((Path(e.path), e.stat) for e in entries), mode, reverse)
@@ -0,0 +1,52 @@
+"""
+Funciones que se ejecutan dentro de los procesos del pool (servicio, redacción...).
+
+Cada proceso guarda su propio NEREngine en una variable de módulo, de modo que
+el modelo de spaCy se carga una sola vez por worker y se reutiliza entre tareas.
+"""
+from dataclasses import asdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .nlp.ner import NEREngine
+
+if TYPE_CHECKING:
+    from .exporters import PreparedIndex
+
+_engine: Optional[NEREngine] = None
+_prefer_small = False
+
+
+def init_worker(prefer_small: bool = False) -> None:
+    """Inicializador del ProcessPoolExecutor: prepara el motor (carga perezosa)."""
+    global _engine, _prefer_small
+    _prefer_small = prefer_small
+    _engine = None
+
+
+def get_engine() -> NEREngine:
+    """Devuelve el NEREngine del proceso actual, cargando el modelo la primera vez."""
+    global _engine
+    if _engine is None:
+        _engine = NEREngine(prefer_small=_prefer_small)
+    _engine.load()
+    return _engine
+
+
+def detect_entities(text: str, use_regex: bool = True, include_email_phone: bool = False) -> List[Dict[str, Any]]:
+    ents = get_engine().detect(text, use_regex=use_regex, include_email_phone=include_email_phone)
+    return [asdict(e) for e in ents]
+
+
+def export_index(fmt: str, prepared: "PreparedIndex", out_path: str) -> str:
+    from .exporters import render
+
+    return str(render(fmt, prepared, Path(out_path)))
+
+
+def redact_document(src: str, dst: str, labels: List[str]):
+    from .redaction import redact_pdf
+
+    engine = get_engine()
+    detect = lambda text: engine.detect(text, include_email_phone=True)
+    return redact_pdf(Path(src), Path(dst), detect, labels=labels)
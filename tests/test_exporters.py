@@ -2,7 +2,17 @@ from pathlib import Path
 import datetime
 import pytest
 
-from expedienteindex.exporters import export_docx, export_pdf
+import csv
+import inspect
+import json
+import os
+import stat
+
+from expedienteindex import exporters
+from expedienteindex.exporters import (
+    export_docx, export_pdf, export_index_docx, export_index_pdf, export_all, prepare_index,
+)
+from expedienteindex.indexing import ConsolidatedIndex, IndexEntry, IndexSection
 
 try:
     from docx import Document as _DocxReader
@@ -26,6 +36,12 @@ def _read_docx_texts(doc_path: Path):
     doc = _DocxReader(str(doc_path))
     return [p.text for p in doc.paragraphs]
 
+def _sample_index() -> ConsolidatedIndex:
+    return ConsolidatedIndex([
+        IndexSection("Demanda", Path("Demanda"), [IndexEntry(1, "Escrito", Path("Escrito.pdf"))]),
+        IndexSection("Recursos", Path("Recursos"), [IndexEntry(2, "Apelación", Path("Apelación.pdf"))]),
+    ])
+
 def _has_entry(texts, entry: str) -> bool:
     return any(t.strip() == entry or t.strip() == f"- {entry}" for t in texts)
 
@@ -119,4 +135,77 @@ def test_pdf_custom_title_no_date(tmp_path: Path):
     reader = _PdfReader(str(out))
     text = "".join((page.extract_text() or "") for page in reader.pages)
     assert custom_title in text
-    assert datetime.date.today().strftime("%d/%m/%Y") not in text
\ No newline at end of file
+    assert datetime.date.today().strftime("%d/%m/%Y") not in text
+
+@pytest.mark.skipif(not DOCX_AVAILABLE, reason="python-docx not available")
+def test_docx_consolidated_index_sections_and_numbering(tmp_path: Path):
+    out = tmp_path / "idx_sections.docx"
+    export_index_docx(_sample_index(), out, show_date=False)
+
+    texts = [t for t in _read_docx_texts(out) if t.strip()]
+    assert texts == ["Índice de Documentos", "Demanda", "1. Escrito", "Recursos", "2. Apelación"]
+
+@pytest.mark.skipif(not PYPDF_AVAILABLE, reason="pypdf not available")
+def test_pdf_consolidated_index_sections_and_numbering(tmp_path: Path):
+    out = tmp_path / "idx_sections.pdf"
+    export_index_pdf(_sample_index(), out, show_date=False)
+
+    reader = _PdfReader(str(out))
+    text = "".join((page.extract_text() or "") for page in reader.pages)
+    assert text.index("Demanda") < text.index("1. Escrito") < text.index("Recursos") < text.index("2. Apelación")
+
+def test_export_functions_keep_explicit_keyword_only_options():
+    header = ["title_text", "show_title", "show_date", "title_align",
+              "font_name", "title_font_size", "body_font_size"]
+    for fn, font in [(export_docx, "Calibri"), (export_pdf, "Helvetica"),
+                     (export_index_docx, "Calibri"), (export_index_pdf, "Helvetica")]:
+        params = inspect.signature(fn).parameters
+        assert all(params[k].kind is inspect.Parameter.KEYWORD_ONLY for k in header)
+        assert params["font_name"].default == font
+
+def test_export_all_lightweight_formats_share_prepared_index(tmp_path: Path):
+    prepared = prepare_index(_sample_index(), title_text="Procedimiento 1/2025", resolve_pdf_font=False)
+    assert prepared.lines == tuple(_sample_index().iter_lines())
+    generated = export_all(prepared, tmp_path, "idx", ["csv", "html", "json"])
+
+    assert [p.name for p in generated] == ["idx.csv", "idx.html", "idx.json"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["idx.csv", "idx.html", "idx.json"]
+
+    with open(tmp_path / "idx.csv", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))
+    assert rows == [["seccion", "numero", "titulo"], ["Demanda", "1", "Escrito"], ["Recursos", "2", "Apelación"]]
+
+    data = json.loads((tmp_path / "idx.json").read_text(encoding="utf-8"))
+    assert data["title"] == "Procedimiento 1/2025"
+    assert [e["number"] for e in data["entries"]] == [1, 2]
+
+    page = (tmp_path / "idx.html").read_text(encoding="utf-8")
+    assert "<h2>Recursos</h2>" in page and "<li>2. Apelación</li>" in page
+
+def test_export_all_failure_keeps_previous_file(tmp_path: Path, monkeypatch):
+    (tmp_path / "idx.json").write_text("previous", encoding="utf-8")
+
+    def broken(prepared, out_path):
+        Path(out_path).write_text("half-written", encoding="utf-8")
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(exporters._RENDERERS, "json", broken)
+    with pytest.raises(RuntimeError):
+        export_all(prepare_index(["A"], resolve_pdf_font=False), tmp_path, "idx", ["csv", "json"])
+
+    assert (tmp_path / "idx.json").read_text(encoding="utf-8") == "previous"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["idx.csv", "idx.json"]
+
+def test_export_all_rejects_unknown_format(tmp_path: Path):
+    with pytest.raises(ValueError):
+        export_all(prepare_index(["A"], resolve_pdf_font=False), tmp_path, "idx", ["xls"])
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_export_all_outputs_keep_regular_permissions(tmp_path: Path):
+    (tmp_path / "idx.json").write_text("previous", encoding="utf-8")
+    os.chmod(tmp_path / "idx.json", 0o640)
+    export_all(prepare_index(["A"], resolve_pdf_font=False), tmp_path, "idx", ["csv", "json"])
+
+    # New files follow the umask like a plain open(); replaced files keep their mode
+    assert stat.S_IMODE((tmp_path / "idx.csv").stat().st_mode) == 0o666 & ~exporters._UMASK
+    assert stat.S_IMODE((tmp_path / "idx.json").stat().st_mode) == 0o640
@@ -1,5 +1,5 @@
 from pathlib import Path
-from expedienteindex.indexing import list_pdf_titles
+from expedienteindex.indexing import list_pdf_titles, build_consolidated_index, section_folders
 
 def test_list_pdf_titles_empty(tmp_path: Path):
     titles, files = list_pdf_titles(tmp_path)
@@ -16,4 +16,44 @@ def test_list_pdf_titles_ignores_non_pdf_and_sorts(tmp_path: Path):
     titles, files = list_pdf_titles(tmp_path)
     # Should ignore .txt and sort alfa, bravo, zeta (case insensitive)
     assert titles == ["alfa", "bravo", "Zeta"]
-    assert [p.name for p in files] == ["alfa.pdf", "bravo.PdF", "Zeta.PDF"]
\ No newline at end of file
+    assert [p.name for p in files] == ["alfa.pdf", "bravo.PdF", "Zeta.PDF"]
+
+def test_list_pdf_titles_natural_order_by_default(tmp_path: Path):
+    for name in ["Doc 10.pdf", "Doc 2.pdf", "Doc 1.pdf"]:
+        (tmp_path / name).write_bytes(b"%PDF-1.4\n%EOF")
+
+    titles, _ = list_pdf_titles(tmp_path)
+    assert titles == ["Doc 1", "Doc 2", "Doc 10"]
+
+    titles, _ = list_pdf_titles(tmp_path, reverse=True)
+    assert titles == ["Doc 10", "Doc 2", "Doc 1"]
+
+def test_list_pdf_titles_by_size(tmp_path: Path):
+    (tmp_path / "grande.pdf").write_bytes(b"%PDF-1.4\n" + b"x" * 100 + b"\n%EOF")
+    (tmp_path / "chico.pdf").write_bytes(b"%PDF-1.4\n%EOF")
+
+    titles, _ = list_pdf_titles(tmp_path, sort="size")
+    assert titles == ["chico", "grande"]
+
+def test_consolidated_index_numbers_across_sections(tmp_path: Path):
+    for folder, names in {
+        "1 Demanda": ["Doc 2.pdf", "Doc 1.pdf"],
+        "2 Prueba documental": ["Factura.pdf", "Contrato.pdf", "nota.txt"],
+        "3 Vacía": [],
+        "10 Recursos": ["Apelación.pdf"],
+    }.items():
+        (tmp_path / folder).mkdir()
+        for name in names:
+            (tmp_path / folder / name).write_bytes(b"%PDF-1.4\n%EOF")
+
+    folders = section_folders(tmp_path)
+    assert [f.name for f in folders] == ["1 Demanda", "2 Prueba documental", "3 Vacía", "10 Recursos"]
+
+    index = build_consolidated_index(folders)
+    assert [s.heading for s in index.sections] == ["1 Demanda", "2 Prueba documental", "10 Recursos"]
+    assert len(index) == 5
+    assert list(index.iter_lines()) == [
+        ("heading", "1 Demanda"), ("entry", "1. Doc 1"), ("entry", "2. Doc 2"),
+        ("heading", "2 Prueba documental"), ("entry", "3. Contrato"), ("entry", "4. Factura"),
+        ("heading", "10 Recursos"), ("entry", "5. Apelación"),
+    ]
@@ -0,0 +1,89 @@
+from pathlib import Path
+import re
+import pytest
+
+from expedienteindex.nlp.ner import DetectedEntity
+from expedienteindex.redaction import (
+    EMPTY_PAGE_NOTICE, MAPPING_FILENAME, mask_text, merge_spans, output_names, redact_pdf, write_mapping,
+)
+
+try:
+    from pypdf import PdfReader as _PdfReader
+    from reportlab.pdfgen import canvas as _canvas
+    PDF_TOOLS_AVAILABLE = True
+except Exception:
+    PDF_TOOLS_AVAILABLE = False
+    _PdfReader = None
+    _canvas = None
+
+_DNI = re.compile(r"\d{8}[A-Z]")
+
+def _fake_detect(text: str):
+    """Detector sin spaCy: solo DNIs, para probar el pipeline de anonimización."""
+    return [DetectedEntity(m.group(0), m.start(), m.end(), "ID_NUMBER", "regex") for m in _DNI.finditer(text)]
+
+def test_merge_spans_filters_labels_and_joins_overlaps():
+    ents = [
+        DetectedEntity("Ana", 0, 3, "PERSON", "spacy"),
+        DetectedEntity("Ana Gil", 0, 7, "PERSON", "spacy"),
+        DetectedEntity("Madrid", 10, 16, "LOC", "spacy"),
+        DetectedEntity("01647550Z", 20, 29, "ID_NUMBER", "regex"),
+    ]
+    assert merge_spans(ents) == [(0, 7), (20, 29)]
+
+def test_mask_text_keeps_length_and_newlines():
+    text = "DNI 0164\n7550Z fin"
+    masked = mask_text(text, [(4, 14)])
+    assert masked == "DNI XXXX\nXXXXX fin"
+    assert len(masked) == len(text)
+
+def test_output_names_do_not_leak_original_names(tmp_path: Path):
+    sources = [tmp_path / "DNI 01647550Z Ana Gil.pdf", tmp_path / "Informe.pdf"]
+    names = output_names(sources)
+    assert names == ["Documento_001_anonimizado.pdf", "Documento_002_anonimizado.pdf"]
+    assert output_names([tmp_path / "x.pdf"] * 1200)[-1] == "Documento_1200_anonimizado.pdf"
+
+    path = write_mapping(tmp_path, sources, [tmp_path / n for n in names])
+    assert path == tmp_path / MAPPING_FILENAME
+    assert path.read_text(encoding="utf-8-sig").splitlines() == [
+        "documento;original",
+        "Documento_001_anonimizado.pdf;DNI 01647550Z Ana Gil.pdf",
+        "Documento_002_anonimizado.pdf;Informe.pdf",
+    ]
+
+@pytest.mark.skipif(not PDF_TOOLS_AVAILABLE, reason="pypdf/reportlab not available")
+def test_redact_pdf_removes_entities_page_by_page(tmp_path: Path):
+    src = tmp_path / "orig.pdf"
+    c = _canvas.Canvas(str(src))
+    for dni in ("01647550Z", "12345678A"):
+        c.drawString(72, 720, f"El interesado con DNI {dni} comparece.")
+        c.showPage()
+    c.save()
+
+    out = tmp_path / "anon.pdf"
+    result = redact_pdf(src, out, _fake_detect)
+    assert result.pages == 2
+    assert result.entities == {"ID_NUMBER": 2}
+
+    reader = _PdfReader(str(out))
+    assert len(reader.pages) == 2
+    text = "".join((page.extract_text() or "") for page in reader.pages)
+    assert "comparece" in text
+    assert "01647550Z" not in text and "12345678A" not in text
+
+@pytest.mark.skipif(not PDF_TOOLS_AVAILABLE, reason="pypdf/reportlab not available")
+def test_redact_pdf_reports_pages_without_text(tmp_path: Path):
+    src = tmp_path / "escaneo.pdf"
+    c = _canvas.Canvas(str(src))
+    c.drawString(72, 720, "Texto con DNI 01647550Z")
+    c.showPage()
+    c.rect(72, 72, 200, 200, fill=1)  # página "escaneada": solo gráficos, sin texto
+    c.showPage()
+    c.save()
+
+    result = redact_pdf(src, tmp_path / "anon.pdf", _fake_detect)
+    assert result.pages == 2
+    assert result.empty_pages == 1
+
+    reader = _PdfReader(str(tmp_path / "anon.pdf"))
+    assert EMPTY_PAGE_NOTICE in (reader.pages[1].extract_text() or "")
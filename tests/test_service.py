@@ -0,0 +1,199 @@
+from pathlib import Path
+import asyncio
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import pytest
+
+from expedienteindex import workers
+from expedienteindex.redaction import RedactionResult
+from expedienteindex.service import IndexService
+
+# Fakes for the pool workers: defined at module level so forked workers can unpickle them
+def _fake_export_index(fmt, prepared, out_path):
+    Path(out_path).write_text(f"{fmt}:{len(prepared.records)}", encoding="utf-8")
+    return out_path
+
+def _fake_detect_entities(text, use_regex=True, include_email_phone=False):
+    if text == "slow":
+        time.sleep(1.5)
+    if text == "boom":
+        raise RuntimeError("modelo no disponible")
+    if text == "bad":
+        raise ValueError("texto no válido")
+    if text == "die":
+        os._exit(1)  # simulates an OOM kill / segfault of the worker
+    return [{"text": text, "start": 0, "end": len(text), "label": "PERSON", "source": "fake", "meta": None}]
+
+def _fake_redact_document(src, dst, labels):
+    time.sleep(0.3)
+    return RedactionResult(Path(src), Path(dst), pages=1, empty_pages=1, entities={"PERSON": len(labels)})
+
+def _request(port: int, method: str, path: str, payload=None, headers=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data, method=method)
+    if data is not None:
+        req.add_header("Content-Type", "application/json")
+    for k, v in (headers or {}).items():
+        req.add_header(k, v)
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, resp.read().decode("utf-8"), dict(resp.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8"), dict(e.headers)
+
+def _run_against_service(calls, *, queue_size=4, stagger=0.0, token=None):
+    """Runs the calls concurrently, `stagger` seconds apart; returns (status, body, headers) each."""
+    async def main():
+        service = IndexService(max_workers=1, queue_size=queue_size, token=token)
+        await service.start("127.0.0.1", 0)
+        try:
+            tasks = []
+            for c in calls:
+                tasks.append(asyncio.create_task(asyncio.to_thread(_request, service.port, *c)))
+                await asyncio.sleep(stagger)
+            return await asyncio.gather(*tasks)
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+def test_service_health_and_unknown_route():
+    (health, body, _), (missing, _, _) = _run_against_service([
+        ("GET", "/health"),
+        ("GET", "/nope"),
+    ])
+    assert health == 200 and json.loads(body)["workers"] == 1
+    assert missing == 404
+
+def test_service_scan_streams_ndjson(tmp_path: Path):
+    for name in ["Doc 10.pdf", "Doc 2.pdf", "nota.txt"]:
+        (tmp_path / name).write_bytes(b"%PDF-1.4\n%EOF")
+
+    (status, body, _), (bad, _, _) = _run_against_service([
+        ("POST", "/scan", {"directory": str(tmp_path)}),
+        ("POST", "/scan", {"directory": str(tmp_path / "no_existe")}),
+    ])
+    assert status == 200
+    assert [json.loads(line)["title"] for line in body.splitlines()] == ["Doc 2", "Doc 10"]
+    assert bad == 400
+
+def test_service_rejects_browser_requests(tmp_path: Path):
+    (origin, _, _), (plain, _, _) = _run_against_service([
+        ("POST", "/scan", {"directory": str(tmp_path)}, {"Origin": "https://example.com"}),
+        ("POST", "/scan", {"directory": str(tmp_path)}, {"Content-Type": "text/plain"}),
+    ])
+    assert origin == 403
+    assert plain == 415
+
+def test_service_export_uses_worker_per_format(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(workers, "export_index", _fake_export_index)
+    for name in ["a.pdf", "b.pdf"]:
+        (tmp_path / name).write_bytes(b"%PDF-1.4\n%EOF")
+    out_dir = tmp_path / "out"
+
+    (status, body, _), (bad, _, _) = _run_against_service([
+        ("POST", "/export", {"directory": str(tmp_path), "output_dir": str(out_dir),
+                             "basename": "idx", "formats": ["csv", "json"]}),
+        ("POST", "/export", {"directory": str(tmp_path), "formats": ["xls"]}),
+    ])
+    assert status == 200
+    assert json.loads(body) == {
+        "generated": [str(out_dir / "idx.csv"), str(out_dir / "idx.json")],
+        "count": 2,
+    }
+    assert (out_dir / "idx.json").read_text(encoding="utf-8") == "json:2"
+    assert bad == 400
+
+def test_service_ner_maps_worker_errors(monkeypatch):
+    monkeypatch.setattr(workers, "detect_entities", _fake_detect_entities)
+
+    (ok, body, _), (boom, boom_body, _), (bad, _, _) = _run_against_service([
+        ("POST", "/ner", {"text": "Ana"}),
+        ("POST", "/ner", {"text": "boom"}),
+        ("POST", "/ner", {"text": "bad"}),
+    ])
+    assert ok == 200 and json.loads(body.splitlines()[0])["text"] == "Ana"
+    assert boom == 500 and "modelo no disponible" in json.loads(boom_body)["error"]
+    assert bad == 400
+
+def test_service_full_queue_answers_503_with_retry_after(monkeypatch):
+    monkeypatch.setattr(workers, "detect_entities", _fake_detect_entities)
+
+    # One job runs in the single worker, one waits in the queue, the third is rejected
+    results = _run_against_service([
+        ("POST", "/ner", {"text": "slow"}),
+        ("POST", "/ner", {"text": "slow"}),
+        ("POST", "/ner", {"text": "slow"}),
+    ], queue_size=1, stagger=0.3)
+    statuses = [r[0] for r in results]
+    assert statuses == [200, 200, 503]
+    assert results[2][2].get("Retry-After") == "1"
+
+def test_service_redact_does_not_starve_other_clients(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(workers, "redact_document", _fake_redact_document)
+    monkeypatch.setattr(workers, "export_index", _fake_export_index)
+    case = tmp_path / "expediente"
+    case.mkdir()
+    for i in range(8):
+        (case / f"Doc {i}.pdf").write_bytes(b"%PDF-1.4\n%EOF")
+
+    (redact, body, _), (export, _, _) = _run_against_service([
+        ("POST", "/redact", {"directory": str(case), "labels": ["PERSON"]}),
+        ("POST", "/export", {"directory": str(case), "output_dir": str(tmp_path / "idx"), "formats": ["csv"]}),
+    ], queue_size=4, stagger=0.5)
+
+    assert export == 200
+    assert redact == 200
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert len(lines) == 8
+    assert all(r["empty_pages"] == 1 and r["entities"] == {"PERSON": 1} for r in lines)
+    # Default output is a sibling folder, never a subfolder of the case
+    out_dir = tmp_path / "expediente_anonimizado"
+    assert all(Path(r["output"]).parent == out_dir for r in lines)
+    # Outputs are named by position; the original names only appear in the mapping
+    assert sorted(Path(r["output"]).name for r in lines) == [f"Documento_00{i}_anonimizado.pdf" for i in range(1, 9)]
+    assert "Doc 0.pdf" in (out_dir / "correspondencia.csv").read_text(encoding="utf-8-sig")
+    assert not any(p.is_dir() for p in case.iterdir())
+
+def test_service_redact_rejects_non_list_labels(tmp_path: Path):
+    (status, _, _), = _run_against_service([
+        ("POST", "/redact", {"directory": str(tmp_path), "labels": "PERSON"}),
+    ])
+    assert status == 400
+
+def test_service_recovers_from_dead_worker(monkeypatch):
+    monkeypatch.setattr(workers, "detect_entities", _fake_detect_entities)
+
+    (died, body, _), (after, _, _) = _run_against_service([
+        ("POST", "/ner", {"text": "die"}),
+        ("POST", "/ner", {"text": "Ana"}),
+    ])
+    assert died == 500 and "inesperadamente" in json.loads(body)["error"]
+    assert after == 200
+
+def test_service_refuses_network_host_without_token():
+    async def main():
+        await IndexService(max_workers=1).start("0.0.0.0", 0)
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+
+def test_service_token_required_when_configured():
+    (missing, _, _), (wrong, _, _), (ok, _, _) = _run_against_service([
+        ("GET", "/health"),
+        ("GET", "/health", None, {"X-ExpedienteIndex-Token": "otro"}),
+        ("GET", "/health", None, {"X-ExpedienteIndex-Token": "s3creto"}),
+    ], token="s3creto")
+    assert missing == 401 and wrong == 401
+    assert ok == 200
+
+def test_service_rejects_mistyped_fields(tmp_path: Path):
+    results = _run_against_service([
+        ("POST", "/export", {"directory": str(tmp_path), "formats": "pdf"}),
+        ("POST", "/scan", {"directory": str(tmp_path), "reverse": "false"}),
+        ("POST", "/export", {"directory": str(tmp_path), "show_date": 0}),
+        ("POST", "/ner", {"text": "Ana", "use_regex": "yes"}),
+    ])
+    assert [r[0] for r in results] == [400, 400, 400, 400]
+    assert "lista" in json.loads(results[0][1])["error"]
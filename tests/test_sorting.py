@@ -0,0 +1,49 @@
+from pathlib import Path
+import os
+import pytest
+
+from expedienteindex.sorting import collation_key, leading_number, sort_dir_entries, sort_paths
+
+def _names(paths):
+    return [p.stem for p in paths]
+
+def test_natural_order_numbers_by_value():
+    paths = [Path(f"Doc {n}.pdf") for n in (10, 2, 1, 21)]
+    assert _names(sort_paths(paths)) == ["Doc 1", "Doc 2", "Doc 10", "Doc 21"]
+
+def test_spanish_collation_accents_and_enye():
+    assert collation_key("Álvarez") == collation_key("alvarez")
+    words = ["Ocaña", "Núñez", "Nunca", "Nuria", "nube"]
+    ordered = _names(sort_paths(Path(f"{w}.pdf") for w in words))
+    # ñ va después de toda la n y antes de la o; las tildes no cuentan
+    assert ordered == ["nube", "Nunca", "Núñez", "Nuria", "Ocaña"]
+
+def test_leading_number_variants():
+    assert leading_number("03 - Demanda") == 3
+    assert leading_number("Doc 12 Poder") == 12
+    assert leading_number("Documento nº 4") == 4
+    assert leading_number("Doc. n.º 7 Poder") == 7
+    assert leading_number("Nº 4 Poder") == 4
+    assert leading_number("n.º 7 Poder") == 7
+    assert leading_number("N° 12") == 12
+    assert leading_number("Demanda") is None
+
+def test_number_mode_puts_unnumbered_last():
+    paths = [Path(p) for p in ["Anexo.pdf", "Doc 10.pdf", "2 - Poder.pdf", "Doc 1.pdf"]]
+    assert _names(sort_paths(paths, "number")) == ["Doc 1", "2 - Poder", "Doc 10", "Anexo"]
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        sort_paths([Path("a.pdf")], "bogus")
+
+def test_sort_dir_entries_uses_entry_stat(tmp_path: Path, monkeypatch):
+    (tmp_path / "grande.pdf").write_bytes(b"x" * 100)
+    (tmp_path / "chico.pdf").write_bytes(b"x")
+
+    def no_path_stat(self, *args, **kwargs):
+        raise AssertionError("Path.stat() should not be called")
+
+    with os.scandir(tmp_path) as it:
+        entries = list(it)
+    monkeypatch.setattr(Path, "stat", no_path_stat)
+    assert _names(sort_dir_entries(entries, "size")) == ["chico", "grande"]